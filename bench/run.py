@@ -0,0 +1,305 @@
+"""
+Benchmark offline do Odds API.
+
+Sobe um servidor local com os snapshots de bench/fixtures (betano, bet365, kto)
+e mede latência (p50/p95/p99), vazão e pico de RSS dos browsers em dois modos:
+
+  scrape  chama scrape_site direto, com páginas do BrowserPool
+  http    faz POST /odds numa instância local do app (uvicorn no mesmo processo)
+
+Uso:
+  python bench/run.py scrape --concurrency 4 --requests 60
+  python bench/run.py http --concurrency 8 --requests 100 --delay-ms 50
+  python bench/run.py http --cached   # mesma URL sempre: mede o caminho do cache
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+SITES = ("betano", "bet365", "kto")
+
+# Odds conhecidas dos snapshots: {site: {linha: (over, under)}}. Se mudar um fixture, mude aqui.
+EXPECTED: Dict[str, Dict[str, Tuple[float, float]]] = {
+    "betano": {"8.5": (1.62, 2.20), "9.5": (1.85, 1.95), "10.5": (2.25, 1.60), "11.5": (2.80, 1.40)},
+    "bet365": {"8.5": (1.61, 2.25), "9.5": (1.83, 1.97), "10.5": (2.20, 1.62), "11.5": (2.75, 1.44)},
+    "kto": {"8.5": (1.60, 2.22), "9.5": (1.87, 1.93), "10.5": (2.30, 1.58), "11.5": (2.85, 1.39)},
+}
+
+sys.path.insert(0, str(ROOT))
+
+
+# ---------- SERVIDOR DE FIXTURES ----------
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serve /<site>[?...] com o snapshot do site; qualquer outra coisa é 404."""
+
+    delay_s = 0.0
+
+    def do_GET(self):
+        if self.delay_s:
+            time.sleep(self.delay_s)
+        site = self.path.lstrip("/").split("?", 1)[0].split("/", 1)[0]
+        path = FIXTURES / f"{site}.html"
+        if site not in SITES or not path.exists():
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = path.read_bytes()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fixture_server(delay_ms: int) -> Tuple[ThreadingHTTPServer, str]:
+    FixtureHandler.delay_s = delay_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+# ---------- MEDIÇÃO ----------
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+
+class RssSampler:
+    """Amostra o RSS dos browsers (main.browser_rss_mb) e guarda o pico."""
+
+    def __init__(self, interval_s: float = 0.2):
+        self.interval_s = interval_s
+        self.peak_mb: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        from main import browser_rss_mb
+
+        while True:
+            rss = browser_rss_mb()
+            if rss is not None:
+                self.peak_mb = max(self.peak_mb or 0.0, rss)
+            await asyncio.sleep(self.interval_s)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+async def run_load(
+    one: Callable[[int], Awaitable[Any]], requests: int, concurrency: int
+) -> Tuple[List[float], float, List[Any]]:
+    """Roda `one(i)` para i em 0..requests-1 com no máximo `concurrency` ao mesmo tempo."""
+    latencies: List[float] = []
+    results: List[Any] = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                results.append(await one(i))
+            except Exception as e:
+                results.append(e)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start, results
+
+
+class Checker:
+    """Confere over/under devolvidos contra EXPECTED e guarda as divergências."""
+
+    def __init__(self, market: str):
+        self.market = market
+        self.correct = 0
+        self.wrong: Dict[str, int] = {}
+        self.samples: List[str] = []
+
+    def check(self, site: str, over: Optional[float], under: Optional[float]) -> None:
+        expected = EXPECTED[site].get(self.market)
+        if expected is None:
+            return
+        if (over, under) == expected:
+            self.correct += 1
+            return
+        self.wrong[site] = self.wrong.get(site, 0) + 1
+        if len(self.samples) < 5:
+            self.samples.append(f"{site} {self.market}: esperado {expected}, veio {(over, under)}")
+
+    def summary(self) -> Dict[str, Any]:
+        if self.market not in EXPECTED[SITES[0]]:
+            return {"valores": f"sem gabarito para a linha {self.market}"}
+        out: Dict[str, Any] = {"corretos": self.correct, "errados": self.wrong or 0}
+        for i, sample in enumerate(self.samples):
+            out[f"  ex{i + 1}"] = sample
+        return out
+
+
+def report(title: str, latencies: List[float], elapsed: float, peak_rss: Optional[float], extra: Dict[str, Any]):
+    print(f"\n== {title} ==")
+    print(f"requests:    {len(latencies)} em {elapsed:.2f}s ({len(latencies) / elapsed:.2f} req/s)")
+    print(
+        "latência:    "
+        f"p50={percentile(latencies, 50) * 1000:.0f}ms "
+        f"p95={percentile(latencies, 95) * 1000:.0f}ms "
+        f"p99={percentile(latencies, 99) * 1000:.0f}ms "
+        f"max={max(latencies, default=0) * 1000:.0f}ms"
+    )
+    print(f"rss browser: {'n/d' if peak_rss is None else f'{peak_rss:.0f} MB (pico)'}")
+    for key, value in extra.items():
+        print(f"{key + ':':<12} {value}")
+
+
+# ---------- MODOS ----------
+async def bench_scrape(args, base_url: str):
+    import main
+
+    pool = main.BrowserPool(size=args.pool_size)
+    await pool.start()
+    sampler = RssSampler()
+    sampler.start()
+
+    async def one(i: int) -> Tuple[str, Dict[str, Any]]:
+        site = SITES[i % len(SITES)]
+        url = f"{base_url}/{site}" if args.cached else f"{base_url}/{site}?i={i}"
+        async with pool.context() as context:
+            page = await context.new_page()
+            try:
+                # results chegam na ordem de término: devolve o site junto
+                return site, await main.scrape_site(page, site, url, args.market)
+            finally:
+                await page.close()
+
+    try:
+        latencies, elapsed, results = await run_load(one, args.requests, args.concurrency)
+    finally:
+        await sampler.stop()
+        await pool.close()
+
+    checker = Checker(args.market)
+    scraped = [r for r in results if isinstance(r, tuple)]
+    for site, r in scraped:
+        checker.check(site, r["over"], r["under"])
+    ok = sum(1 for _, r in scraped if r["ok"])
+    errors = sum(1 for r in results if isinstance(r, Exception))
+    report("scrape_site", latencies, elapsed, sampler.peak_mb, {"ok": ok, "exceções": errors, **checker.summary()})
+    print_stages(main.METRICS)
+
+
+async def bench_http(args, base_url: str):
+    import httpx
+    import uvicorn
+    import main
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=args.port, log_level="warning"))
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        if serve.done():
+            serve.result()
+        await asyncio.sleep(0.05)
+
+    sampler = RssSampler()
+    sampler.start()
+    statuses: Dict[int, int] = {}
+    checker = Checker(args.market)
+    strategies: Dict[str, int] = {}
+    timings: Dict[str, List[float]] = {}
+
+    async def one(i: int) -> int:
+        suffix = "" if args.cached else f"?i={i}"
+        payload = {"market": args.market}
+        for site in SITES:
+            payload[site] = {"url": f"{base_url}/{site}{suffix}"}
+        resp = await client.post(f"http://127.0.0.1:{args.port}/odds", json=payload)
+        statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+        if resp.status_code == 200:
+            body = resp.json()
+            for site in SITES:
+                strategy = body[site].get("strategy", "?")
+                strategies[strategy] = strategies.get(strategy, 0) + 1
+                checker.check(site, body[site]["over"], body[site]["under"])
+        for entry in resp.headers.get("server-timing", "").split(","):
+            name, _, dur = entry.strip().partition(";dur=")
+            if dur:
+                timings.setdefault(name, []).append(float(dur))
+        return resp.status_code
+
+    try:
+        async with httpx.AsyncClient(timeout=120) as client:
+            latencies, elapsed, _ = await run_load(one, args.requests, args.concurrency)
+    finally:
+        await sampler.stop()
+        server.should_exit = True
+        await serve
+
+    report(
+        "POST /odds", latencies, elapsed, sampler.peak_mb,
+        {"status": statuses, "estratégias": strategies, **checker.summary()},
+    )
+    if timings:
+        print("\nServer-Timing (média ms):")
+        for name in sorted(timings):
+            values = timings[name]
+            print(f"  {name:<20} {sum(values) / len(values):8.1f}  (n={len(values)})")
+
+
+def print_stages(metrics) -> None:
+    """Resumo das etapas a partir do histograma odds_stage_seconds."""
+    series = metrics.histogram_summary("odds_stage_seconds")
+    if not series:
+        return
+    print("\nEtapas (média ms):")
+    for labels, count, total in sorted(series, key=lambda s: (s[0]["site"], s[0]["stage"])):
+        if count:
+            print(f"  {labels['site']:<8} {labels['stage']:<10} {total / count * 1000:8.1f}  (n={count:g})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline do Odds API")
+    parser.add_argument("mode", choices=["scrape", "http"])
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=3)
+    parser.add_argument("--market", default="9.5")
+    parser.add_argument("--delay-ms", type=int, default=0, help="atraso artificial do servidor de fixtures")
+    parser.add_argument("--pool-size", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cached", action="store_true", help="repete a mesma URL (mede cache/coalescing)")
+    args = parser.parse_args()
+
+    # a config do app é lida do ambiente na importação de main
+    os.environ.setdefault("POOL_SIZE", str(args.pool_size))
+    if not args.cached:
+        os.environ.setdefault("CACHE_MAX_ENTRIES", "0")
+
+    server, base_url = start_fixture_server(args.delay_ms)
+    try:
+        if args.mode == "scrape":
+            asyncio.run(bench_scrape(args, base_url))
+        else:
+            asyncio.run(bench_http(args, base_url))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,31 @@
 # main.py
+import os
 import re
 import json
-from typing import Optional, Dict, Any, List
+import time
+import uuid
+import asyncio
+import logging
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager, AsyncExitStack
+from typing import Optional, Dict, Any, List, Set, Tuple, Callable, Awaitable, Union
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 
-from fastapi import FastAPI, HTTPException
+import httpx
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel, Field, HttpUrl
 
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
+from playwright.async_api import async_playwright, Browser, BrowserContext, TimeoutError as PWTimeout
 
-app = FastAPI(title="Odds API", version="1.0.0")
+log = logging.getLogger("uvicorn.error")
 
 # ---------- MODELOS ----------
+# Teto do /odds/batch: cada evento abre até 3 páginas dentro de um único job.
+BATCH_MAX_EVENTS = 5
+BATCH_MAX_MARKETS = 20
+
 class SiteIn(BaseModel):
     url: HttpUrl
 
@@ -26,6 +41,11 @@ class SiteOut(BaseModel):
     over: Optional[float] = None
     under: Optional[float] = None
     err: str = ""
+    selector_errors: List[str] = Field(default_factory=list, description="Seletores que falharam na extração")
+    strategy: str = Field("playwright", description="Quem produziu o resultado: http | playwright")
+    source: str = Field("none", description="De onde vieram as odds: text (linha achada no texto) | selector | none")
+    cache: str = Field("miss", description="hit | miss | stale | coalesced")
+    cache_age_s: Optional[float] = Field(None, description="Idade (s) do resultado servido")
 
 class OddsResponse(BaseModel):
     market: str
@@ -33,10 +53,56 @@ class OddsResponse(BaseModel):
     bet365: SiteOut
     kto: SiteOut
 
+class EventIn(BaseModel):
+    betano: SiteIn
+    bet365: SiteIn
+    kto: SiteIn
+
+class BatchOddsRequest(BaseModel):
+    markets: List[str] = Field(
+        ..., min_length=1, max_length=BATCH_MAX_MARKETS, description="Linhas do mercado, ex: ['8.5', '9.5', '10.5']"
+    )
+    events: List[EventIn] = Field(..., min_length=1, max_length=BATCH_MAX_EVENTS)
+
+class EventOddsOut(BaseModel):
+    markets: List[OddsResponse]
+
+class BatchOddsResponse(BaseModel):
+    events: List[EventOddsOut]
+
+class JobOut(BaseModel):
+    id: str
+    status: str = Field(..., description="queued | running | done | error")
+    result: Optional[Union[OddsResponse, BatchOddsResponse]] = None
+    error: str = ""
+
 
 # ---------- CONFIGURAÇÃO DE SELETORES (pode ajustar depois) ----------
+# Recursos que não ajudam a achar odds; abortados via page.route para economizar tempo e banda.
+BLOCK_RESOURCE_TYPES = ["image", "media", "font"]
+ANALYTICS_DOMAINS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "facebook.net",
+    "hotjar.com",
+    "clarity.ms",
+    "segment.io",
+    "optimizely.com",
+    "nr-data.net",
+    "tiktok.com",
+]
+
 # Damos mais de uma opção por site porque eles mudam HTML com frequência.
-SITE_SELECTORS: Dict[str, Dict[str, List[str]]] = {
+# Além dos seletores, cada site define:
+#   ready_timeout_ms: quanto esperar, no máximo, o primeiro seletor de odds (ou o texto
+#     "mais de/menos de/over/under <linha>") aparecer antes de extrair
+#   block_resources / block_domains: o que abortar antes de carregar a página
+#   fast_path: tentativa via HTTP (httpx) antes de abrir o Chromium, ou None
+#     {"strategy": "html"}                          -> GET na própria URL, texto do HTML
+#     {"strategy": "json", "url": ".../api{path}"}  -> GET num endpoint JSON ({url}, {path}, {query})
+SITE_SELECTORS: Dict[str, Dict[str, Any]] = {
     "betano": {
         "over": [
             # exemplos típicos de "Mais de X" (odds em cards)
@@ -49,6 +115,10 @@ SITE_SELECTORS: Dict[str, Dict[str, List[str]]] = {
             'div:has-text("Menos de") ~ div [data-qa="bet-odds"]',
             'button[data-test="odd"]',
         ],
+        "ready_timeout_ms": 3000,
+        "block_resources": BLOCK_RESOURCE_TYPES,
+        "block_domains": ANALYTICS_DOMAINS,
+        "fast_path": None,  # odds renderizadas no cliente: o GET não acha nada
     },
     "bet365": {
         "over": [
@@ -60,6 +130,10 @@ SITE_SELECTORS: Dict[str, Dict[str, List[str]]] = {
             'div.gl-Participant_Odds',
             'span.gl-Participant_Odds',
         ],
+        "ready_timeout_ms": 4000,
+        "block_resources": BLOCK_RESOURCE_TYPES,
+        "block_domains": ANALYTICS_DOMAINS,
+        "fast_path": None,  # odds só aparecem depois do JS
     },
     "kto": {
         "over": [
@@ -70,9 +144,37 @@ SITE_SELECTORS: Dict[str, Dict[str, List[str]]] = {
             'button.odds',
             'div.odds',
         ],
+        "ready_timeout_ms": 3000,
+        "block_resources": BLOCK_RESOURCE_TYPES,
+        "block_domains": ANALYTICS_DOMAINS,
+        "fast_path": {"strategy": "html"},
     },
 }
 
+# Tempo máximo (s) que cada site tem para abrir + extrair; um site lento não segura os outros.
+SITE_DEADLINE_S: Dict[str, float] = {
+    "betano": 18.0,
+    "bet365": 18.0,
+    "kto": 18.0,
+}
+DEFAULT_SITE_DEADLINE_S = 18.0
+
+# Quantos scrapes de cada site podem rodar ao mesmo tempo (só faltas do cache contam).
+SITE_CONCURRENCY: Dict[str, int] = {
+    "betano": 2,
+    "bet365": 2,
+    "kto": 2,
+}
+DEFAULT_SITE_CONCURRENCY = 2
+
+# Por quanto tempo (s) um resultado de cada site pode ser reaproveitado do cache.
+SITE_CACHE_TTL_S: Dict[str, float] = {
+    "betano": 5.0,
+    "bet365": 5.0,
+    "kto": 5.0,
+}
+DEFAULT_SITE_CACHE_TTL_S = 5.0
+
 # Palavras que ajudam no fallback textual
 KEYS_OVER = ["mais de", "over"]
 KEYS_UNDER = ["menos de", "under"]
@@ -97,123 +199,1682 @@ def to_float(txt: str) -> Optional[float]:
         return None
 
 
-def find_near_market(text: str, market: str, keys: List[str]) -> Optional[float]:
+MARKET_PAIR_RE = re.compile(r"(mais de|menos de|over|under)\s*([0-9]+(?:\.[0-9]+)?)")
+ODD_RE = re.compile(r"[0-9]+\.[0-9]+")
+
+MarketIndex = Dict[Tuple[str, str], float]
+
+
+def normalize_market(market: str) -> str:
+    """'9,5 ' -> '9.5' (mesma normalização aplicada ao texto da página)."""
+    return market.strip().lower().replace(",", ".")
+
+
+def build_market_index(text: str) -> MarketIndex:
     """
-    Procura odds perto de 'Mais de 9.5' ou 'Menos de 9.5' no HTML (fallback).
-    Pega o número com padrão decimal logo após/antes do termo.
+    Varre o HTML uma vez e indexa todo par 'mais de/menos de/over/under <linha>'
+    com a primeira odd decimal que vem depois dele e antes do próximo par
+    (linha suspensa fica sem odd): {(termo, linha): odd}.
+    Para cada termo vale a primeira ocorrência da linha no texto.
     """
-    text_low = re.sub(r"\s+", " ", text.lower())
-    # Normaliza decimal (vírgula -> ponto) só para procurar
-    text_low = text_low.replace(",", ".")
+    text_low = re.sub(r"\s+", " ", text.lower()).replace(",", ".")
+    pairs = list(MARKET_PAIR_RE.finditer(text_low))
+    index: MarketIndex = {}
+    for i, m in enumerate(pairs):
+        key = (m.group(1), m.group(2))
+        if key in index:
+            continue
+        end = pairs[i + 1].start() if i + 1 < len(pairs) else len(text_low)
+        odd = ODD_RE.search(text_low, m.end(), end)
+        if odd:
+            val = to_float(odd.group(0))
+            if val is not None:
+                index[key] = val
+    return index
+
+
+def lookup_market(index: MarketIndex, market: str, keys: List[str]) -> Optional[float]:
+    """Busca a linha no índice, tentando os termos na ordem de `keys`."""
+    line = normalize_market(market)
     for key in keys:
-        # ex: "mais de 9.5" ou "under 9.5"
-        pattern = rf"{key}\s*{re.escape(market)}.*?([0-9]+\.[0-9]+)"
-        m = re.search(pattern, text_low)
-        if m:
-            return to_float(m.group(1))
+        val = index.get((key, line))
+        if val is not None:
+            return val
     return None
 
 
-def scrape_site(page, site: str, url: str, market: str, timeout_ms: int = 12000) -> Dict[str, Any]:
+def market_odds(
+    index: MarketIndex, market: str, sel_over: Optional[float] = None, sel_under: Optional[float] = None
+) -> Tuple[Optional[float], Optional[float]]:
     """
-    Tenta extrair over/under para o mercado informado.
-    1) Tenta por seletores
-    2) Se falhar, tenta fallback textual no HTML
+    Over/under de uma linha, tirados do índice do texto (que liga a odd à linha).
+    Os valores dos seletores não sabem de qual linha são: só valem quando a
+    página não tem texto de mercado nenhum, e quem chama só os passa quando há
+    um mercado só. Se o texto existe mas não tem a linha, a linha não está lá.
     """
+    if not index:
+        return sel_over, sel_under
+    return lookup_market(index, market, KEYS_OVER), lookup_market(index, market, KEYS_UNDER)
+
+
+# ---------- MÉTRICAS ----------
+# Tempos por etapa do request atual ({"betano_nav": s, ...}), viram o header Server-Timing.
+# O dict é compartilhado com as tasks filhas (cache), que herdam o contexto.
+REQUEST_TIMINGS: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "REQUEST_TIMINGS", default=None
+)
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """Contadores e histogramas em memória, expostos no formato texto do Prometheus."""
+
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[LabelSet, float]] = {}
+        self._hists: Dict[str, Dict[LabelSet, List[float]]] = {}  # buckets..., soma, contagem
+        self._help: Dict[str, Tuple[str, str]] = {}
+
+    def inc(self, name: str, doc: str, value: float = 1.0, **labels: str) -> None:
+        self._help.setdefault(name, ("counter", doc))
+        series = self._counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, doc: str, seconds: float, **labels: str) -> None:
+        self._help.setdefault(name, ("histogram", doc))
+        series = self._hists.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        hist = series.setdefault(key, [0.0] * (len(self.BUCKETS) + 2))
+        for i, le in enumerate(self.BUCKETS):
+            if seconds <= le:
+                hist[i] += 1
+        hist[-2] += seconds
+        hist[-1] += 1
+
+    @staticmethod
+    def _labels(key: LabelSet, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        items = key + extra
+        if not items:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+    def histogram_summary(self, name: str) -> List[Tuple[Dict[str, str], float, float]]:
+        """(labels, contagem, soma em segundos) de cada série do histograma."""
+        return [
+            (dict(key), hist[-1], hist[-2])
+            for key, hist in list(self._hists.get(name, {}).items())
+        ]
+
+    def render(
+        self,
+        gauges: Optional[Dict[str, Tuple[str, Optional[float]]]] = None,
+        totals: Optional[Dict[str, Tuple[str, float]]] = None,
+    ) -> str:
+        """
+        Formato texto do Prometheus. `gauges` e `totals` são valores lidos de fora
+        (pool, cache, fila): {nome: (descrição, valor)}; `totals` saem como counter.
+        """
+        lines: List[str] = []
+        for name, series in list(self._counters.items()):
+            kind, doc = self._help[name]
+            lines += [f"# HELP {name} {doc}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{self._labels(k)} {v:g}" for k, v in list(series.items())]
+        for name, series in list(self._hists.items()):
+            kind, doc = self._help[name]
+            lines += [f"# HELP {name} {doc}", f"# TYPE {name} {kind}"]
+            for key, hist in list(series.items()):
+                for i, le in enumerate(self.BUCKETS):
+                    lines.append(f"{name}_bucket{self._labels(key, (('le', f'{le:g}'),))} {hist[i]:g}")
+                lines.append(f"{name}_bucket{self._labels(key, (('le', '+Inf'),))} {hist[-1]:g}")
+                lines.append(f"{name}_sum{self._labels(key)} {hist[-2]:.6f}")
+                lines.append(f"{name}_count{self._labels(key)} {hist[-1]:g}")
+        for name, (doc, value) in (gauges or {}).items():
+            if value is None:
+                continue
+            lines += [f"# HELP {name} {doc}", f"# TYPE {name} gauge", f"{name} {value:g}"]
+        for name, (doc, value) in (totals or {}).items():
+            lines += [f"# HELP {name} {doc}", f"# TYPE {name} counter", f"{name} {value:g}"]
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def stage(site: str, name: str):
+    """Mede uma etapa do scrape (nav, ready, index, extract, fast_path, total)."""
+    start = time.perf_counter()
     try:
-        page.goto(url, timeout=timeout_ms, wait_until="domcontentloaded")
-    except PWTimeout:
-        return {"ok": False, "url": url, "over": None, "under": None, "err": "Timeout ao abrir a página"}
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        METRICS.observe("odds_stage_seconds", "Duração de cada etapa do scrape", elapsed, site=site, stage=name)
+        timings = REQUEST_TIMINGS.get()
+        if timings is not None:
+            key = f"{site}_{name}"
+            timings[key] = timings.get(key, 0.0) + elapsed
 
-    # Aguarda um pouco mais por conteúdos dinâmicos (renderização JS)
-    page.wait_for_timeout(1500)
 
-    sel_conf = SITE_SELECTORS.get(site, {})
-    over = None
-    under = None
+def count_timeout(site: str, name: str) -> None:
+    METRICS.inc("odds_timeouts_total", "Timeouts por site e etapa", site=site, stage=name)
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={secs * 1000:.1f}" for name, secs in timings.items())
+
+
+# ---------- POOL DE BROWSERS ----------
+def env_int(name: str, default: int) -> int:
+    """Lê um inteiro de variável de ambiente, caindo no padrão se vier vazio/inválido."""
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+# No plano free do Render (512 MB) cabe 1 Chromium com folga; aumente em máquinas maiores.
+POOL_SIZE = env_int("POOL_SIZE", 1)
+POOL_CONTEXTS_PER_BROWSER = env_int("POOL_CONTEXTS_PER_BROWSER", 4)
+POOL_MAX_USES = env_int("POOL_MAX_USES", 50)          # recicla o browser após N contextos
+POOL_MAX_RSS_MB = env_int("POOL_MAX_RSS_MB", 400)     # recicla o browser cujo processo passar disso (0 = desliga)
+POOL_RSS_CHECK_INTERVAL_S = env_int("POOL_RSS_CHECK_INTERVAL_S", 10)  # no máximo uma leitura de /proc por intervalo
+POOL_ACQUIRE_TIMEOUT_S = env_int("POOL_ACQUIRE_TIMEOUT_S", 30)  # páginas ao vivo; scrapes param antes, no SITE_DEADLINE_S
+
+BROWSER_ARGS = ["--disable-gpu", "--no-sandbox"]
+CONTEXT_OPTIONS: Dict[str, Any] = {
+    "user_agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+    ),
+    "locale": "pt-BR",
+    "viewport": {"width": 1366, "height": 800},
+}
+
+
+ProcessTable = Tuple[Dict[int, List[int]], Dict[int, int]]
+
+
+def read_process_table() -> Optional[ProcessTable]:
+    """
+    Lê /proc e devolve (filhos por pid, RSS em bytes por pid).
+    Só funciona no Linux; em outros sistemas devolve None.
+    """
+    try:
+        pids = [int(p) for p in os.listdir("/proc") if p.isdigit()]
+    except OSError:
+        return None
 
-    # 1) TENTATIVA POR SELETORES
-    for sel in sel_conf.get("over", []):
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    children: Dict[int, List[int]] = {}
+    rss: Dict[int, int] = {}
+    for pid in pids:
         try:
-            # pega vários elementos e tenta o primeiro que pareça odd
-            elems = page.query_selector_all(sel)
-            for el in elems:
-                txt = (el.inner_text() or "").strip()
-                val = to_float(txt)
-                if val:
-                    over = val
-                    break
-            if over:
-                break
+            with open(f"/proc/{pid}/stat") as f:
+                stat = f.read()
+            # o nome do processo pode ter espaços; os campos começam depois do último ')'
+            fields = stat.rsplit(")", 1)[1].split()
+            ppid = int(fields[1])
+            rss[pid] = int(fields[21]) * page_size
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(pid)
+    return children, rss
+
+
+def descendants(table: ProcessTable, root: int) -> Set[int]:
+    children, _ = table
+    found: Set[int] = set()
+    stack = list(children.get(root, []))
+    while stack:
+        pid = stack.pop()
+        found.add(pid)
+        stack.extend(children.get(pid, []))
+    return found
+
+
+def tree_rss_mb(table: ProcessTable, root: int) -> float:
+    """RSS (MB) de um processo e de todos os descendentes."""
+    _, rss = table
+    total = rss.get(root, 0) + sum(rss.get(pid, 0) for pid in descendants(table, root))
+    return total / (1024 * 1024)
+
+
+def browser_rss_mb(table: Optional[ProcessTable] = None) -> Optional[float]:
+    """
+    Soma o RSS (MB) de todos os processos filhos deste processo
+    (driver do Playwright + Chromium). Lê /proc, então só funciona no Linux.
+    """
+    if table is None:
+        table = read_process_table()
+    if table is None:
+        return None
+    _, rss = table
+    return sum(rss.get(pid, 0) for pid in descendants(table, os.getpid())) / (1024 * 1024)
+
+
+class PoolExhausted(Exception):
+    """Nenhum browser ficou livre dentro do tempo de espera."""
+
+
+class PooledBrowser:
+    """Um processo Chromium do pool e seus contadores."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.browser: Optional[Browser] = None
+        self.uses = 0
+        self.active = 0          # contextos abertos agora
+        self.live = 0            # contextos ao vivo abertos (não seguram a reciclagem)
+        self.draining = False    # marcado para reciclar quando active chegar a 0
+        self.recycling = False
+        self.parked = 0          # vagas retiradas da fila enquanto drena
+        self.pid: Optional[int] = None  # processo raiz do Chromium (para medir o RSS dele)
+        self.launched_at = 0.0
+
+
+class BrowserPool:
+    """
+    Mantém N Chromium já iniciados (criados no lifespan do FastAPI).
+    Cada aquisição recebe um BrowserContext novo e isolado, com o mesmo
+    UA/locale/viewport de antes; cada browser aceita até
+    POOL_CONTEXTS_PER_BROWSER contextos simultâneos. O browser é reciclado
+    (depois que os contextos em uso fecham) após POOL_MAX_USES contextos,
+    se cair, ou se a árvore de processos dele passar de POOL_MAX_RSS_MB.
+    Contextos ao vivo (live=True) ficam abertos enquanto houver assinante, então
+    não seguram a reciclagem: as páginas deles fecham junto com o browser.
+    """
+
+    def __init__(
+        self,
+        size: int = POOL_SIZE,
+        contexts_per_browser: int = POOL_CONTEXTS_PER_BROWSER,
+        max_uses: int = POOL_MAX_USES,
+        max_rss_mb: int = POOL_MAX_RSS_MB,
+        acquire_timeout_s: float = POOL_ACQUIRE_TIMEOUT_S,
+    ):
+        self.size = max(1, size)
+        self.contexts_per_browser = max(1, contexts_per_browser)
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.acquire_timeout_s = acquire_timeout_s
+        self.recycled = 0
+        self._pw = None
+        self._slots: List[PooledBrowser] = []
+        # cada item da fila é uma vaga de contexto num browser
+        self._idle: "asyncio.Queue[PooledBrowser]" = asyncio.Queue()
+        self._tasks: Set[asyncio.Task] = set()
+        self._closed = False
+        # lançamentos em série: o pid do Chromium novo é o processo que apareceu no meio
+        self._launch_lock = asyncio.Lock()
+        self._rss_table: Optional[ProcessTable] = None
+        self._rss_checked_at = 0.0
+
+    async def start(self) -> None:
+        self._pw = await async_playwright().start()
+        for i in range(self.size):
+            slot = PooledBrowser(i)
+            await self._launch(slot)
+            self._slots.append(slot)
+            for _ in range(self.contexts_per_browser):
+                self._idle.put_nowait(slot)
+
+    async def close(self) -> None:
+        self._closed = True
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for slot in self._slots:
+            await self._close_browser(slot)
+        if self._pw is not None:
+            await self._pw.stop()
+            self._pw = None
+
+    async def _launch(self, slot: PooledBrowser) -> None:
+        async with self._launch_lock:
+            before = read_process_table()
+            slot.browser = await self._pw.chromium.launch(headless=True, args=BROWSER_ARGS)
+            after = read_process_table()
+        slot.pid = None
+        if before is not None and after is not None:
+            new = descendants(after, os.getpid()) - descendants(before, os.getpid())
+            children, _ = after
+            # o Chromium é filho do driver do Playwright (filho direto deste processo);
+            # renderers que outros browsers abriram no meio têm o Chromium deles como pai
+            launched = {
+                pid for driver in children.get(os.getpid(), []) for pid in children.get(driver, [])
+            } & new
+            if len(launched) == 1:
+                slot.pid = launched.pop()
+            elif self.max_rss_mb:
+                log.warning(
+                    "pool: pid do browser %d não encontrado (%d candidatos); reciclagem por RSS desligada para ele",
+                    slot.index, len(launched),
+                )
+        slot.uses = 0
+        slot.launched_at = time.monotonic()
+
+    def _slot_rss_mb(self, slot: PooledBrowser) -> Optional[float]:
+        """RSS do Chromium do slot, relendo /proc no máximo a cada POOL_RSS_CHECK_INTERVAL_S."""
+        if slot.pid is None:
+            return None
+        now = time.monotonic()
+        if self._rss_table is None or now - self._rss_checked_at >= POOL_RSS_CHECK_INTERVAL_S:
+            self._rss_table = read_process_table()
+            self._rss_checked_at = now
+        if self._rss_table is None:
+            return None
+        return tree_rss_mb(self._rss_table, slot.pid)
+
+    async def _close_browser(self, slot: PooledBrowser) -> None:
+        browser, slot.browser = slot.browser, None
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception:
+                pass
+
+    def _needs_recycle(self, slot: PooledBrowser) -> bool:
+        if slot.browser is None or not slot.browser.is_connected():
+            return True
+        if self.max_uses and slot.uses >= self.max_uses:
+            return True
+        if self.max_rss_mb:
+            rss = self._slot_rss_mb(slot)
+            if rss is not None and rss > self.max_rss_mb:
+                return True
+        return False
+
+    async def _recycle(self, slot: PooledBrowser) -> None:
+        try:
+            await self._close_browser(slot)
+            self.recycled += 1
+            await self._launch(slot)
         except Exception:
+            # se não conseguiu relançar, a próxima aquisição tenta de novo
             pass
+        finally:
+            slot.draining = False
+            slot.recycling = False
+            parked, slot.parked = slot.parked, 0
+            for _ in range(parked):
+                self._idle.put_nowait(slot)
+
+    def _park(self, slot: PooledBrowser) -> None:
+        """Segura a vaga de um browser que está drenando; recicla quando ele esvaziar."""
+        slot.parked += 1
+        if self._closed or slot.recycling or slot.active > 0:
+            return
+        slot.recycling = True
+        # relança em segundo plano para não segurar a resposta do request
+        task = asyncio.create_task(self._recycle(slot))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _take_slot(self) -> PooledBrowser:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.acquire_timeout_s
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise PoolExhausted("Nenhum browser livre no pool")
+            try:
+                slot = await asyncio.wait_for(self._idle.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                raise PoolExhausted("Nenhum browser livre no pool")
+            # health check: browser caiu ou nunca subiu -> drena e relança
+            if not slot.draining and (slot.browser is None or not slot.browser.is_connected()):
+                slot.draining = True
+            if slot.draining:
+                self._park(slot)
+                continue
+            return slot
 
-    for sel in sel_conf.get("under", []):
+    def _release(self, slot: PooledBrowser, live: bool = False) -> None:
+        if live:
+            slot.live -= 1
+        else:
+            slot.active -= 1
+        if not self._closed and not slot.draining and self._needs_recycle(slot):
+            slot.draining = True
+        if slot.draining:
+            self._park(slot)
+        else:
+            self._idle.put_nowait(slot)
+
+    @asynccontextmanager
+    async def context(self, live: bool = False):
+        """
+        Empresta uma vaga do pool e entrega um BrowserContext novo.
+        live=True: contexto de longa duração (página ao vivo), fora da conta de drenagem.
+        """
+        if self._closed:
+            raise PoolExhausted("Pool de browsers encerrado")
+        slot = await self._take_slot()
+        if live:
+            slot.live += 1
+        else:
+            slot.active += 1
+        slot.uses += 1
+
+        context: Optional[BrowserContext] = None
         try:
-            elems = page.query_selector_all(sel)
-            for el in elems:
-                txt = (el.inner_text() or "").strip()
-                val = to_float(txt)
-                if val:
-                    under = val
-                    break
-            if under:
-                break
+            context = await slot.browser.new_context(**CONTEXT_OPTIONS)
+            yield context
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+            self._release(slot, live)
+
+    def stats(self, table: Optional[ProcessTable] = None) -> Dict[str, Any]:
+        """Estado do pool; `table` é uma leitura de /proc já feita (read_process_table)."""
+        now = time.monotonic()
+        return {
+            "size": self.size,
+            "contexts_per_browser": self.contexts_per_browser,
+            "idle": self._idle.qsize(),
+            "recycled": self.recycled,
+            "rss_mb": browser_rss_mb(table) if table is not None else None,
+            "browsers": [
+                {
+                    "index": s.index,
+                    "connected": bool(s.browser and s.browser.is_connected()),
+                    "active": s.active,
+                    "live": s.live,
+                    "draining": s.draining,
+                    "uses": s.uses,
+                    "rss_mb": tree_rss_mb(table, s.pid) if table is not None and s.pid is not None else None,
+                    "age_s": round(now - s.launched_at, 1) if s.launched_at else None,
+                }
+                for s in self._slots
+            ],
+        }
+
+
+# ---------- CACHE DE ODDS ----------
+CACHE_MAX_ENTRIES = env_int("CACHE_MAX_ENTRIES", 500)
+CACHE_STALE_WHILE_REVALIDATE = env_int("CACHE_STALE_WHILE_REVALIDATE", 1) == 1
+CACHE_STALE_MAX_S = env_int("CACHE_STALE_MAX_S", 30)  # quanto tempo além do TTL ainda serve dado velho
+
+CacheKey = Tuple[str, str, str]
+
+
+def normalize_url(url: str) -> str:
+    """Normaliza a URL para a chave do cache: host minúsculo, sem fragmento, query ordenada."""
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ""))
+
+
+class CacheEntry:
+    def __init__(self, value: Dict[str, Any]):
+        self.value = value
+        self.stored_at = time.monotonic()
+
+
+class OddsCache:
+    """
+    Cache LRU com TTL por site para resultados de scrape_site, chaveado por
+    (site, url normalizada, mercado). Requisições iguais simultâneas
+    compartilham um único scrape (single-flight) e, se habilitado, um dado
+    vencido há pouco é servido enquanto a atualização roda em segundo plano.
+    Só resultados com ok=True tirados do texto da página são guardados: odds de
+    seletor não dizem a linha e valeriam para qualquer mercado pedido depois.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        stale_while_revalidate: bool = CACHE_STALE_WHILE_REVALIDATE,
+        stale_max_s: float = CACHE_STALE_MAX_S,
+    ):
+        self.max_entries = max_entries
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_max_s = stale_max_s
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.coalesced = 0
+        self._entries: "OrderedDict[CacheKey, CacheEntry]" = OrderedDict()
+        self._inflight: Dict[CacheKey, asyncio.Task] = {}
+
+    async def get_or_fetch_many(
+        self,
+        keys: List[CacheKey],
+        ttl_s: float,
+        fetch_many: Callable[[List[CacheKey]], Awaitable[Dict[CacheKey, Dict[str, Any]]]],
+    ) -> Dict[CacheKey, Dict[str, Any]]:
+        """
+        Resultados das chaves (todas da mesma página): acertos saem do cache,
+        chaves já em andamento esperam o scrape que está rodando e tudo que
+        faltar (ou estiver vencido) é buscado numa única chamada de fetch_many.
+        """
+        results: Dict[CacheKey, Dict[str, Any]] = {}
+        waiting: Dict[CacheKey, Tuple[asyncio.Task, str]] = {}
+        to_fetch: List[CacheKey] = []
+        now = time.monotonic()
+
+        for key in dict.fromkeys(keys):
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.stored_at
+                if age <= ttl_s:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    results[key] = {**entry.value, "cache": "hit", "cache_age_s": round(age, 2)}
+                    continue
+                if self.stale_while_revalidate and age <= ttl_s + self.stale_max_s:
+                    self.stale += 1
+                    self._entries.move_to_end(key)
+                    results[key] = {**entry.value, "cache": "stale", "cache_age_s": round(age, 2)}
+                    if key not in self._inflight:
+                        to_fetch.append(key)
+                    continue
+
+            if key in self._inflight:
+                self.coalesced += 1
+                waiting[key] = (self._inflight[key], "coalesced")
+            else:
+                self.misses += 1
+                to_fetch.append(key)
+
+        if to_fetch:
+            self._start(to_fetch, fetch_many)
+            for key in to_fetch:
+                if key not in results:  # chaves "stale" só atualizam em segundo plano
+                    waiting[key] = (self._inflight[key], "miss")
+
+        for key, (task, status) in waiting.items():
+            # shield: se este request for cancelado, o scrape continua para os outros
+            value = await asyncio.shield(task)
+            results[key] = {**value, "cache": status, "cache_age_s": 0.0}
+        return results
+
+    def _start(
+        self,
+        keys: List[CacheKey],
+        fetch_many: Callable[[List[CacheKey]], Awaitable[Dict[CacheKey, Dict[str, Any]]]],
+    ) -> None:
+        batch = asyncio.create_task(fetch_many(keys))
+        for key in keys:
+            task = asyncio.create_task(self._pick(batch, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._done(key, t))
+
+    @staticmethod
+    async def _pick(batch: asyncio.Task, key: CacheKey) -> Dict[str, Any]:
+        return (await batch)[key]
+
+    def _done(self, key: CacheKey, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        value = task.result()
+        if value.get("ok") and value.get("source") == "text":
+            self._store(key, value)
+
+    def _store(self, key: CacheKey, value: Dict[str, Any]) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = CacheEntry(value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "coalesced": self.coalesced,
+        }
+
+
+# ---------- FAST PATH (HTTP) ----------
+HTTP_TIMEOUT_S = env_int("HTTP_TIMEOUT_S", 5)
+HTTP_MAX_CONNECTIONS = env_int("HTTP_MAX_CONNECTIONS", 20)
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Cliente compartilhado (keep-alive + HTTP/2) com o mesmo UA/idioma do Chromium."""
+    return httpx.AsyncClient(
+        http2=True,
+        follow_redirects=True,
+        timeout=HTTP_TIMEOUT_S,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+        ),
+        headers={
+            "User-Agent": CONTEXT_OPTIONS["user_agent"],
+            "Accept-Language": "pt-BR,pt;q=0.9",
+        },
+    )
+
+
+def json_text(data: Any) -> str:
+    """Achata um JSON em texto ('Mais de 9.5 1.85 ...') para reaproveitar o índice de mercados."""
+    parts: List[str] = []
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            stack.extend(reversed(list(item.values())))
+        elif isinstance(item, list):
+            stack.extend(reversed(item))
+        elif isinstance(item, (str, int, float)) and not isinstance(item, bool):
+            parts.append(str(item))
+    return " ".join(parts)
+
+
+async def fast_path_html(client: httpx.AsyncClient, url: str, conf: Dict[str, Any]) -> MarketIndex:
+    resp = await client.get(url)
+    resp.raise_for_status()
+    return build_market_index(resp.text)
+
+
+async def fast_path_json(client: httpx.AsyncClient, url: str, conf: Dict[str, Any]) -> MarketIndex:
+    parts = urlsplit(url)
+    api_url = conf["url"].format(url=url, path=parts.path, query=parts.query)
+    resp = await client.get(api_url, headers={"Accept": "application/json"})
+    resp.raise_for_status()
+    return build_market_index(json_text(resp.json()))
+
+
+# strategy -> função que baixa a página/endpoint e devolve o índice de mercados
+FAST_PATHS: Dict[str, Callable[[httpx.AsyncClient, str, Dict[str, Any]], Awaitable[MarketIndex]]] = {
+    "html": fast_path_html,
+    "json": fast_path_json,
+}
+
+
+async def try_fast_path(
+    client: httpx.AsyncClient, site: str, url: str, markets: List[str]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Tenta resolver os mercados sem browser. Devolve só os mercados em que achou
+    alguma odd; o resto (ou qualquer erro de rede/parse) fica para o Playwright.
+    """
+    conf = SITE_SELECTORS.get(site, {}).get("fast_path")
+    if not conf or conf.get("strategy") not in FAST_PATHS:
+        return {}
+    try:
+        index = await FAST_PATHS[conf["strategy"]](client, url, conf)
+    except Exception:
+        return {}
+
+    results = {}
+    for market in markets:
+        over, under = market_odds(index, market)
+        if over is not None or under is not None:
+            results[market] = {
+                "ok": True, "url": url, "over": over, "under": under, "err": "", "strategy": "http",
+                "source": "text",
+            }
+    return results
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    pool = BrowserPool()
+    await pool.start()
+    app.state.pool = pool
+    app.state.cache = OddsCache()
+    app.state.live = LiveHub(pool)
+    app.state.http = create_http_client()
+
+    limits = site_limits()
+
+    async def fetch_site(site: str, url: str, markets: List[str]) -> Dict[str, Dict[str, Any]]:
+        return await cached_scrape(pool, app.state.http, app.state.cache, limits, site, url, markets)
+
+    app.state.jobs = JobQueue(fetch_site)
+    app.state.jobs.start()
+    try:
+        yield
+    finally:
+        await app.state.jobs.close()
+        await app.state.live.close()
+        await app.state.http.aclose()
+        await pool.close()
+
+
+app = FastAPI(title="Odds API", version="1.0.0", lifespan=lifespan)
+
+
+# ---------- SCRAPING ----------
+def is_blocked_domain(url: str, domains: List[str]) -> bool:
+    host = (urlsplit(url).hostname or "").lower()
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+
+async def apply_resource_policy(page, sel_conf: Dict[str, Any]) -> None:
+    """Aborta imagens/mídia/fontes e domínios de analytics conforme a config do site."""
+    block_types = set(sel_conf.get("block_resources", []))
+    block_domains = sel_conf.get("block_domains", [])
+    if not block_types and not block_domains:
+        return
+
+    async def handle(route):
+        req = route.request
+        try:
+            if req.resource_type in block_types or is_blocked_domain(req.url, block_domains):
+                await route.abort()
+            else:
+                await route.continue_()
         except Exception:
+            # página pode ter fechado no meio (deadline do site)
             pass
 
-    # 2) FALLBACK POR TEXTO (se ainda não achou)
-    if over is None or under is None:
-        html = page.content()
-        if over is None:
-            over = find_near_market(html, market, KEYS_OVER)
-        if under is None:
-            under = find_near_market(html, market, KEYS_UNDER)
-
-    ok = over is not None or under is not None
-    err = "" if ok else "Não encontrei odds no texto da página"
-
-    return {"ok": ok, "url": url, "over": over, "under": under, "err": err}
-
-
-def run_playwright(payload: OddsRequest) -> OddsResponse:
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True, args=["--disable-gpu", "--no-sandbox"])
-        context = browser.new_context(
-            user_agent=(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                "(KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
-            ),
-            locale="pt-BR",
-            viewport={"width": 1366, "height": 800},
-        )
-        page = context.new_page()
+    await page.route("**/*", handle)
+
+
+# Texto que o fallback procura ("mais de 9.5", "under 10,5"...); se já está na página, dá para seguir.
+MARKET_TEXT_JS = r"""() => /(mais de|menos de|over|under)\s*[0-9]/i.test(document.body ? document.body.innerText : "")"""
+
+
+async def wait_for_odds(page, sel_conf: Dict[str, Any]) -> bool:
+    """
+    Espera o primeiro seletor de odds do site aparecer, ou o texto de mercado
+    que o fallback usa, até ready_timeout_ms.
+    Retorna True assim que um dos dois aparece; False se estourou o tempo.
+    """
+    selectors = list(dict.fromkeys(sel_conf.get("over", []) + sel_conf.get("under", [])))
+    if not selectors:
+        # sem seletores não há o que esperar: mantém a espera fixa antiga
+        await page.wait_for_timeout(1500)
+        return False
+
+    timeout_ms = sel_conf.get("ready_timeout_ms", 3000)
+    waiters = [
+        asyncio.ensure_future(page.wait_for_selector(sel, timeout=timeout_ms))
+        for sel in selectors
+    ]
+    # páginas em que só o fallback textual acha odds não esperam o teto inteiro
+    waiters.append(asyncio.ensure_future(page.wait_for_function(MARKET_TEXT_JS, timeout=timeout_ms, polling=200)))
+    try:
+        pending = set(waiters)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if any(not t.cancelled() and t.exception() is None for t in done):
+                return True
+        return False
+    finally:
+        for t in waiters:
+            if not t.done():
+                t.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+
+
+# Mesmas regras de to_float, no browser: só números/vírgula/ponto, vírgula sozinha vira ponto.
+TO_FLOAT_JS = r"""
+const toFloat = (txt) => {
+  if (!txt) return null;
+  txt = txt.trim().replace(/[^0-9,.]/g, "");
+  if (!txt) return null;
+  if (txt.includes(",") && !txt.includes(".")) txt = txt.replace(/,/g, ".");
+  if (!/^(\d+\.?\d*|\.\d+)$/.test(txt)) return null;
+  return parseFloat(txt);
+};
+"""
+
+# Recebe {over: [...], under: [...]} e devolve, por lado, o primeiro seletor (na ordem)
+# com um texto que pareça odd, mais os índices dos seletores que não são CSS puro.
+EXTRACT_JS = "(conf) => {" + TO_FLOAT_JS + r"""
+  const out = {};
+  for (const side of ["over", "under"]) {
+    const res = { hit: null, invalid: [] };
+    (conf[side] || []).some((sel, index) => {
+      let els;
+      try {
+        els = document.querySelectorAll(sel);
+      } catch (e) {
+        res.invalid.push(index);
+        return false;
+      }
+      for (const el of els) {
+        const text = (el.innerText || "").trim();
+        if (toFloat(text)) {
+          res.hit = { index, text };
+          return true;
+        }
+      }
+      return false;
+    });
+    out[side] = res;
+  }
+  return out;
+}"""
+
+# Para seletores do Playwright (ex: :has-text) que o querySelectorAll não entende.
+FIRST_ODD_JS = "(els) => {" + TO_FLOAT_JS + r"""
+  for (const el of els) {
+    const text = (el.innerText || "").trim();
+    if (toFloat(text)) return text;
+  }
+  return null;
+}"""
+
+
+async def extract_odds(page, sel_conf: Dict[str, Any]) -> Tuple[Optional[float], Optional[float], List[str]]:
+    """
+    Extrai over/under com um único page.evaluate para todos os seletores do site.
+    Seletores que só o Playwright entende (ex: ':has-text') custam uma chamada
+    extra cada, e só quando vêm antes do seletor que já achou a odd.
+    Erros são devolvidos por seletor, ex: "over: div.x: mensagem".
+    """
+    conf = selector_lists(sel_conf)
+    try:
+        found = await page.evaluate(EXTRACT_JS, conf)
+    except Exception as e:
+        return None, None, [f"evaluate: {e}"]
+    return await resolve_extracted(page, conf, found)
+
+
+def selector_lists(sel_conf: Dict[str, Any]) -> Dict[str, List[str]]:
+    return {side: list(sel_conf.get(side, [])) for side in ("over", "under")}
+
+
+async def resolve_extracted(
+    page, conf: Dict[str, List[str]], found: Dict[str, Any]
+) -> Tuple[Optional[float], Optional[float], List[str]]:
+    """Converte o resultado do EXTRACT_JS em odds, resolvendo os seletores do Playwright."""
+    errors: List[str] = []
+    values: Dict[str, Optional[float]] = {}
+    for side, selectors in conf.items():
+        res = found.get(side) or {}
+        hit = res.get("hit")
+        hit_index = hit["index"] if hit else len(selectors)
+        value = to_float(hit["text"]) if hit else None
+
+        # respeita a ordem da lista: seletores do Playwright antes do acerto têm prioridade
+        for index in res.get("invalid", []):
+            if index >= hit_index:
+                break
+            sel = selectors[index]
+            try:
+                text = await page.locator(sel).evaluate_all(FIRST_ODD_JS)
+            except Exception as e:
+                errors.append(f"{side}: {sel}: {e}")
+                continue
+            val = to_float(text or "")
+            if val:
+                value = val
+                break
+        values[side] = value
+
+    return values["over"], values["under"], errors
+
+
+def site_error(url: str, err: str, markets: List[str]) -> Dict[str, Dict[str, Any]]:
+    return {m: {"ok": False, "url": url, "over": None, "under": None, "err": err} for m in markets}
+
+
+async def scrape_site_markets(
+    page, site: str, url: str, markets: List[str], timeout_ms: int = 12000
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Abre a página uma vez e extrai over/under para cada mercado informado.
+    1) Índice do texto da página: cada linha com a sua odd, para todos os mercados
+    2) Seletores: só com um mercado único e quando a página não tem texto de mercado
+    """
+    sel_conf = SITE_SELECTORS.get(site, {})
+    await apply_resource_policy(page, sel_conf)
+
+    try:
+        with stage(site, "nav"):
+            await page.goto(url, timeout=timeout_ms, wait_until="domcontentloaded")
+    except PWTimeout:
+        count_timeout(site, "nav")
+        return site_error(url, "Timeout ao abrir a página", markets)
+
+    # Aguarda as odds renderizarem (JS); segue assim que o primeiro seletor aparece
+    with stage(site, "ready"):
+        if not await wait_for_odds(page, sel_conf):
+            count_timeout(site, "ready")
 
-        # Para cada site, tenta extrair
-        b1 = scrape_site(page, "betano", str(payload.betano.url), payload.market)
-        b2 = scrape_site(page, "bet365", str(payload.bet365.url), payload.market)
-        b3 = scrape_site(page, "kto", str(payload.kto.url), payload.market)
+    # 1) ÍNDICE DO TEXTO (uma leitura do HTML para todos os mercados)
+    with stage(site, "index"):
+        index = build_market_index(await page.content())
 
-        context.close()
-        browser.close()
+    # 2) SELETORES (uma ida ao browser para o site inteiro). As odds dos seletores
+    # não estão ligadas a uma linha, então só servem quando há um mercado só e o
+    # texto não diz nada; se o texto tem outras linhas, a pedida não está na página.
+    over = under = None
+    selector_errors: List[str] = []
+    if len(markets) == 1 and not index:
+        with stage(site, "extract"):
+            over, under, selector_errors = await extract_odds(page, sel_conf)
+
+    results = {}
+    for market in markets:
+        m_over, m_under = market_odds(index, market, over, under)
+        for side, value, keys in (("over", m_over, KEYS_OVER), ("under", m_under, KEYS_UNDER)):
+            if value is None:
+                source = "none"
+            elif lookup_market(index, market, keys) is not None:
+                source = "text"
+            else:
+                source = "selector"
+            METRICS.inc("odds_extraction_total", "De onde veio cada odd (texto da página, seletor ou nada)",
+                        site=site, side=side, source=source)
+        ok = m_over is not None or m_under is not None
+        err = "" if ok else "Não encontrei odds no texto da página"
+        results[market] = {
+            "ok": ok, "url": url, "over": m_over, "under": m_under, "err": err,
+            "selector_errors": selector_errors,
+            "source": ("text" if index else "selector") if ok else "none",
+        }
+    return results
+
+
+async def scrape_site(page, site: str, url: str, market: str, timeout_ms: int = 12000) -> Dict[str, Any]:
+    """Tenta extrair over/under para o mercado informado."""
+    return (await scrape_site_markets(page, site, url, [market], timeout_ms))[market]
+
+
+async def scrape_site_isolated(
+    pool: BrowserPool, http: httpx.AsyncClient, site: str, url: str, markets: List[str]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Tenta primeiro o fast path HTTP do site; os mercados que ele não resolver
+    vão para o Playwright. Tudo (fast path, espera por vaga no pool e a página)
+    cabe no deadline do site; se estourar, vira SiteOut com ok=False.
+    """
+    deadline = SITE_DEADLINE_S.get(site, DEFAULT_SITE_DEADLINE_S)
+    strategy = "http"
+
+    async def run() -> Dict[str, Dict[str, Any]]:
+        nonlocal strategy
+        found: Dict[str, Dict[str, Any]] = {}
+        if SITE_SELECTORS.get(site, {}).get("fast_path"):
+            with stage(site, "fast_path"):
+                found = await try_fast_path(http, site, url, markets)
+        missing = [m for m in markets if m not in found]
+        if missing:
+            strategy = "playwright"
+            found.update(await scrape_site_browser(pool, site, url, missing))
+        return found
+
+    with stage(site, "total"):
+        try:
+            found = await asyncio.wait_for(run(), timeout=deadline)
+        except asyncio.TimeoutError:
+            count_timeout(site, "deadline")
+            found = site_error(url, f"Tempo limite do site excedido ({deadline:g}s)", markets)
+    METRICS.inc("odds_strategy_total", "Páginas resolvidas por estratégia", site=site, strategy=strategy)
+    return found
+
+
+async def scrape_site_browser(pool: BrowserPool, site: str, url: str, markets: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Roda scrape_site_markets num contexto/página próprios do site.
+    Qualquer falha, inclusive o pool encerrado, vira um SiteOut com ok=False em
+    vez de derrubar os outros sites. A espera por vaga no pool é cortada pelo
+    deadline do site (scrape_site_isolated), antes de POOL_ACQUIRE_TIMEOUT_S.
+    """
+    try:
+        async with pool.context() as context:
+            page = None
+            try:
+                page = await context.new_page()
+                return await scrape_site_markets(page, site, url, markets)
+            except Exception as e:
+                return site_error(url, str(e), markets)
+            finally:
+                if page is not None:
+                    try:
+                        await page.close()
+                    except Exception:
+                        pass
+    except PoolExhausted as e:
+        return site_error(url, str(e), markets)
+
+
+def site_limits() -> Dict[str, asyncio.Semaphore]:
+    return {
+        site: asyncio.Semaphore(SITE_CONCURRENCY.get(site, DEFAULT_SITE_CONCURRENCY))
+        for site in SITE_SELECTORS
+    }
+
+
+async def cached_scrape(
+    pool: BrowserPool,
+    http: httpx.AsyncClient,
+    cache: OddsCache,
+    limits: Dict[str, asyncio.Semaphore],
+    site: str,
+    url: str,
+    markets: List[str],
+) -> Dict[str, Dict[str, Any]]:
+    """
+    scrape_site_isolated passando pelo cache (TTL do site + single-flight).
+    Os mercados que faltam no cache saem de um único carregamento da página;
+    só esse carregamento ocupa o limite de concorrência do site, então acertos
+    do cache e quem espera um scrape em andamento não ficam na fila.
+    Devolve {mercado informado: resultado}.
+    """
+    norm_url = normalize_url(url)
+    keys = {m: (site, norm_url, normalize_market(m)) for m in markets}
+    ttl = SITE_CACHE_TTL_S.get(site, DEFAULT_SITE_CACHE_TTL_S)
+
+    async def fetch_many(missing: List[CacheKey]) -> Dict[CacheKey, Dict[str, Any]]:
+        lines = [k[2] for k in missing]
+        async with limits[site]:
+            found = await scrape_site_isolated(pool, http, site, url, lines)
+        return {k: found[k[2]] for k in missing}
+
+    found = await cache.get_or_fetch_many(list(keys.values()), ttl, fetch_many)
+    return {m: found[k] for m, k in keys.items()}
+
+
+# fetch(site, url, mercados) -> {mercado: resultado}; normalmente cached_scrape
+SiteFetch = Callable[[str, str, List[str]], Awaitable[Dict[str, Dict[str, Any]]]]
+
+
+async def run_playwright(fetch: SiteFetch, payload: OddsRequest) -> OddsResponse:
+    # Fast path HTTP primeiro; quem precisar de browser usa os do pool, cada site em paralelo
+    market = payload.market
+    b1, b2, b3 = await asyncio.gather(
+        fetch("betano", str(payload.betano.url), [market]),
+        fetch("bet365", str(payload.bet365.url), [market]),
+        fetch("kto", str(payload.kto.url), [market]),
+    )
 
     return OddsResponse(
-        market=payload.market,
-        betano=SiteOut(**b1),
-        bet365=SiteOut(**b2),
-        kto=SiteOut(**b3),
+        market=market,
+        betano=SiteOut(**b1[market]),
+        bet365=SiteOut(**b2[market]),
+        kto=SiteOut(**b3[market]),
     )
 
 
+async def run_playwright_batch(fetch: SiteFetch, payload: BatchOddsRequest) -> BatchOddsResponse:
+    # Cada URL carrega uma vez só; os mercados saem do mesmo carregamento
+    markets = list(dict.fromkeys(payload.markets))
+    jobs = []
+    for event in payload.events:
+        for site in ("betano", "bet365", "kto"):
+            url = str(getattr(event, site).url)
+            jobs.append(fetch(site, url, markets))
+    found = await asyncio.gather(*jobs)
+
+    events = []
+    for i in range(len(payload.events)):
+        b1, b2, b3 = found[3 * i : 3 * i + 3]
+        events.append(EventOddsOut(markets=[
+            OddsResponse(
+                market=m,
+                betano=SiteOut(**b1[m]),
+                bet365=SiteOut(**b2[m]),
+                kto=SiteOut(**b3[m]),
+            )
+            for m in markets
+        ]))
+    return BatchOddsResponse(events=events)
+
+
+# ---------- AO VIVO (SSE) ----------
+LIVE_MAX_PAGES = env_int("LIVE_MAX_PAGES", 2)         # páginas abertas ao mesmo tempo (cada uma ocupa uma vaga do pool)
+LIVE_IDLE_CLOSE_S = env_int("LIVE_IDLE_CLOSE_S", 30)  # fecha a página se ficar sem assinantes por esse tempo
+LIVE_HEARTBEAT_S = env_int("LIVE_HEARTBEAT_S", 15)
+LIVE_DEBOUNCE_MS = env_int("LIVE_DEBOUNCE_MS", 250)
+LIVE_QUEUE_SIZE = 100
+
+# Mesmas regras de build_market_index, no browser: [[termo, linha, odd], ...].
+MARKET_INDEX_JS = r"""
+const marketIndex = (text) => {
+  const low = text.toLowerCase().replace(/\s+/g, " ").replace(/,/g, ".");
+  const pairs = [...low.matchAll(/(mais de|menos de|over|under)\s*([0-9]+(?:\.[0-9]+)?)/g)];
+  const seen = new Set();
+  const index = [];
+  pairs.forEach((m, i) => {
+    const key = m[1] + " " + m[2];
+    if (seen.has(key)) return;
+    const end = i + 1 < pairs.length ? pairs[i + 1].index : low.length;
+    const odd = low.slice(m.index + m[0].length, end).match(/[0-9]+\.[0-9]+/);
+    if (!odd) return;
+    seen.add(key);
+    index.push([m[1], m[2], parseFloat(odd[0])]);
+  });
+  return index;
+};
+"""
+
+# Instala um MutationObserver que, quando o DOM muda, roda o EXTRACT_JS e monta o
+# índice por linha na própria página; só chama o Python (window.__oddsChanged) se
+# as odds dos seletores ou algum par linha/odd mudaram (relógio do jogo não conta).
+# Observa o body inteiro porque os sites costumam trocar os nós de odds em vez de
+# editar o texto. Só no frame principal: iframes (anúncios, players) não têm as odds.
+OBSERVE_JS = "(conf) => { if (window.top !== window) return; const extract = " + EXTRACT_JS + ";" + MARKET_INDEX_JS + r"""
+  const install = () => {
+    let last = null;
+    let timer = null;
+    const check = () => {
+      timer = null;
+      const found = extract(conf);
+      found.index = marketIndex(document.body.innerText);
+      const snap = JSON.stringify([
+        found.over.hit && found.over.hit.text,
+        found.under.hit && found.under.hit.text,
+        found.index,
+      ]);
+      if (snap === last) return;
+      last = snap;
+      window.__oddsChanged(found);
+    };
+    new MutationObserver(() => {
+      if (!timer) timer = setTimeout(check, conf.debounce_ms);
+    }).observe(document.body, { subtree: true, childList: true, characterData: true });
+    check();
+  };
+  if (document.readyState === "loading") {
+    document.addEventListener("DOMContentLoaded", install);
+  } else {
+    install();
+  }
+}"""
+
+
+class LiveLimitReached(Exception):
+    """Já existem LIVE_MAX_PAGES páginas ao vivo abertas."""
+
+
+class LiveWatcher:
+    """
+    Uma página aberta para (site, url), compartilhada por todos os assinantes.
+    Cada mudança detectada na página vira um evento por mercado assinado,
+    enviado só quando over/under daquele mercado mudaram.
+    """
+
+    def __init__(self, pool: BrowserPool, site: str, url: str):
+        self.pool = pool
+        self.site = site
+        self.url = url
+        self.sel_conf = SITE_SELECTORS.get(site, {})
+        self.conf = selector_lists(self.sel_conf)
+        self.page = None
+        self.refs = 0
+        self.over: Optional[float] = None
+        self.under: Optional[float] = None
+        self.index: MarketIndex = {}
+        self.ready = False
+        self.closed = False
+        self.subscribers: Dict[str, Set["asyncio.Queue[Optional[Dict[str, Any]]]"]] = {}
+        self.last: Dict[str, Tuple[Optional[float], Optional[float]]] = {}
+        self.idle_task: Optional[asyncio.Task] = None
+        self._close_task: Optional[asyncio.Task] = None
+        self._stack = AsyncExitStack()
+        self._lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        if self.closed:
+            raise RuntimeError("Página ao vivo já foi fechada")
+        context = await self._stack.enter_async_context(self.pool.context(live=True))
+        self.page = await context.new_page()
+        # crash, página fechada ou browser desconectado/reciclado: encerra os assinantes
+        context.on("close", self._gone)
+        self.page.on("close", self._gone)
+        self.page.on("crash", self._gone)
+        await apply_resource_policy(self.page, self.sel_conf)
+        await self.page.expose_function("__oddsChanged", self._on_change)
+        # init script: reinstala o observer se o site recarregar a página
+        conf = {**self.conf, "debounce_ms": LIVE_DEBOUNCE_MS}
+        await self.page.add_init_script(f"({OBSERVE_JS})({json.dumps(conf)})")
+        await self.page.goto(self.url, timeout=12000, wait_until="domcontentloaded")
+
+    async def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        for queues in self.subscribers.values():
+            for queue in queues:
+                self._put(queue, None)
+        await self._stack.aclose()
+
+    def _gone(self, _) -> None:
+        if self.closed or self._close_task is not None:
+            return
+        self._close_task = asyncio.create_task(self.close())
+
+    async def _on_change(self, found: Dict[str, Any]) -> None:
+        async with self._lock:
+            if self.closed:
+                return
+            over, under, _ = await resolve_extracted(self.page, self.conf, found)
+            index = {(term, line): odd for term, line, odd in found.get("index", [])}
+            self.over, self.under, self.index = over, under, index
+            self.ready = True
+            self._publish_all()
+
+    def _values(self, market: str) -> Tuple[Optional[float], Optional[float]]:
+        # odds dos seletores não sabem de qual linha são: só valem com um mercado assinado
+        if len(self.subscribers) == 1:
+            return market_odds(self.index, market, self.over, self.under)
+        return market_odds(self.index, market)
+
+    def _publish(self, market: str, only: Optional["asyncio.Queue"] = None) -> None:
+        over, under = self._values(market)
+        prev = self.last.get(market)
+        if only is None and prev == (over, under):
+            return
+        self.last[market] = (over, under)
+        changed = [
+            side for side, i in (("over", 0), ("under", 1))
+            if prev is None or prev[i] != (over, under)[i]
+        ]
+        event = {
+            "site": self.site, "url": self.url, "market": market,
+            "over": over, "under": under, "changed": changed, "ts": time.time(),
+        }
+        for queue in ([only] if only is not None else self.subscribers.get(market, ())):
+            self._put(queue, event)
+
+    @staticmethod
+    def _put(queue: "asyncio.Queue", item: Optional[Dict[str, Any]]) -> None:
+        # assinante lento: descarta o evento mais antigo em vez de crescer sem limite
+        if queue.full():
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        queue.put_nowait(item)
+
+    def subscribe(self, market: str) -> "asyncio.Queue[Optional[Dict[str, Any]]]":
+        queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+        new_market = market not in self.subscribers
+        self.subscribers.setdefault(market, set()).add(queue)
+        if self.ready:
+            # estado atual para quem acabou de chegar
+            self._publish(market, only=queue)
+            if new_market:
+                # com mais de um mercado os seletores deixam de valer: avisa quem mudou
+                self._publish_all()
+        return queue
+
+    def _publish_all(self) -> None:
+        for market in self.subscribers:
+            self._publish(market)
+
+    def unsubscribe(self, market: str, queue: "asyncio.Queue") -> None:
+        queues = self.subscribers.get(market)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[market]
+            self.last.pop(market, None)
+            if self.ready:
+                self._publish_all()
+
+
+class LiveHub:
+    """Registro das páginas ao vivo, com contagem de referência e fechamento por ociosidade."""
+
+    def __init__(self, pool: BrowserPool, max_pages: int = LIVE_MAX_PAGES, idle_close_s: float = LIVE_IDLE_CLOSE_S):
+        self.pool = pool
+        self.max_pages = max_pages
+        self.idle_close_s = idle_close_s
+        self._watchers: Dict[Tuple[str, str], LiveWatcher] = {}
+        self._starting: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    async def subscribe(self, site: str, url: str, market: str) -> Tuple[LiveWatcher, "asyncio.Queue"]:
+        key = (site, normalize_url(url))
+        watcher = self._watchers.get(key)
+        if watcher is None or watcher.closed:
+            if len(self._watchers) >= self.max_pages and key not in self._watchers:
+                raise LiveLimitReached("Limite de páginas ao vivo atingido")
+            watcher = LiveWatcher(self.pool, site, url)
+            self._watchers[key] = watcher
+            self._starting[key] = asyncio.create_task(watcher.start())
+        watcher.refs += 1
+        if watcher.idle_task is not None:
+            watcher.idle_task.cancel()
+            watcher.idle_task = None
+
+        starting = self._starting.get(key)
+        if starting is not None:
+            try:
+                await asyncio.shield(starting)
+            except asyncio.CancelledError:
+                # só este assinante desistiu; o start segue para os outros
+                watcher.refs -= 1
+                if watcher.refs <= 0:
+                    self._forget(watcher)
+                    starting.cancel()
+                    await asyncio.gather(starting, return_exceptions=True)
+                    await watcher.close()
+                raise
+            except Exception:
+                # o start falhou para todos: o último a sair fecha o que ele abriu
+                watcher.refs -= 1
+                self._forget(watcher)
+                if watcher.refs <= 0:
+                    await watcher.close()
+                raise
+            finally:
+                if starting.done() and self._starting.get(key) is starting:
+                    del self._starting[key]
+        return watcher, watcher.subscribe(normalize_market(market))
+
+    async def unsubscribe(self, watcher: LiveWatcher, market: str, queue: "asyncio.Queue") -> None:
+        watcher.unsubscribe(normalize_market(market), queue)
+        watcher.refs -= 1
+        if watcher.refs > 0:
+            return
+        if watcher.closed:
+            # página caiu: nada a esperar
+            self._forget(watcher)
+        elif watcher.idle_task is None:
+            watcher.idle_task = asyncio.create_task(self._close_when_idle(watcher))
+
+    def _forget(self, watcher: LiveWatcher) -> None:
+        key = (watcher.site, normalize_url(watcher.url))
+        if self._watchers.get(key) is watcher:
+            del self._watchers[key]
+
+    async def _close_when_idle(self, watcher: LiveWatcher) -> None:
+        await asyncio.sleep(self.idle_close_s)
+        if watcher.refs > 0:
+            return
+        self._forget(watcher)
+        await watcher.close()
+
+    async def close(self) -> None:
+        for watcher in list(self._watchers.values()):
+            if watcher.idle_task is not None:
+                watcher.idle_task.cancel()
+            await watcher.close()
+        self._watchers.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pages": len(self._watchers),
+            "max_pages": self.max_pages,
+            "watchers": [
+                {"site": w.site, "url": w.url, "refs": w.refs, "markets": sorted(w.subscribers)}
+                for w in self._watchers.values()
+            ],
+        }
+
+
+# ---------- FILA DE JOBS ----------
+JOB_WORKERS = env_int("JOB_WORKERS", 4)              # jobs rodando ao mesmo tempo (limite global)
+JOB_QUEUE_SIZE = env_int("JOB_QUEUE_SIZE", 50)       # jobs esperando; acima disso responde 429
+JOB_RESULT_TTL_S = env_int("JOB_RESULT_TTL_S", 300)  # por quanto tempo o resultado fica consultável
+JOB_RETRY_AFTER_S = env_int("JOB_RETRY_AFTER_S", 5)
+JOB_MAX_WAIT_S = 30                                  # teto do long-poll em GET /jobs/{id}
+JOB_SYNC_TIMEOUT_S = env_int("JOB_SYNC_TIMEOUT_S", 120)  # quanto /odds e /odds/batch esperam o job
+
+
+class QueueFull(Exception):
+    """A fila de jobs está cheia; o cliente deve tentar de novo depois."""
+
+
+class Job:
+    def __init__(self, kind: str, payload: BaseModel, key: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.payload = payload
+        self.key = key
+        self.status = "queued"
+        self.result: Optional[BaseModel] = None
+        self.error = ""
+        self.timings: Dict[str, float] = {}  # etapas do scrape, para o Server-Timing
+        self.created_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.done = asyncio.Event()
+
+    def out(self) -> JobOut:
+        return JobOut(id=self.id, status=self.status, result=self.result, error=self.error)
+
+
+class JobQueue:
+    """
+    Fila de scrapes com JOB_WORKERS workers (limite global; o limite por site,
+    SITE_CONCURRENCY, fica em cached_scrape). Jobs iguais ainda pendentes são
+    deduplicados; com a fila cheia, submit levanta QueueFull em vez de empilhar
+    trabalho sem limite.
+    """
+
+    RUNNERS: Dict[str, Callable[[SiteFetch, Any], Awaitable[BaseModel]]] = {
+        "odds": run_playwright,
+        "batch": run_playwright_batch,
+    }
+
+    def __init__(
+        self,
+        fetch: SiteFetch,
+        workers: int = JOB_WORKERS,
+        max_queued: int = JOB_QUEUE_SIZE,
+        result_ttl_s: float = JOB_RESULT_TTL_S,
+    ):
+        self.fetch = fetch
+        self.workers = max(1, workers)
+        self.result_ttl_s = result_ttl_s
+        self.deduplicated = 0
+        self.rejected = 0
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=max(1, max_queued))
+        self._jobs: Dict[str, Job] = {}
+        self._pending: Dict[str, Job] = {}  # chave do payload -> job ainda não terminado
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def submit(self, kind: str, payload: BaseModel) -> Job:
+        self._prune()
+        key = f"{kind}:{payload.model_dump_json()}"
+        job = self._pending.get(key)
+        if job is not None:
+            self.deduplicated += 1
+            return job
+        if self._queue.full():
+            self.rejected += 1
+            raise QueueFull("Fila de jobs cheia")
+        job = Job(kind, payload, key)
+        self._jobs[job.id] = job
+        self._pending[key] = job
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    async def wait(self, job: Job, timeout_s: Optional[float] = None) -> Job:
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout=timeout_s)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.monotonic()
+            token = REQUEST_TIMINGS.set(job.timings)
+            try:
+                job.result = await self.RUNNERS[job.kind](self.fetch, job.payload)
+                job.status = "done"
+            except Exception as e:
+                job.status = "error"
+                job.error = str(e)
+            finally:
+                REQUEST_TIMINGS.reset(token)
+                job.finished_at = time.monotonic()
+                job.timings["queue"] = job.started_at - job.created_at
+                job.timings["total"] = job.finished_at - job.created_at
+                self._pending.pop(job.key, None)
+                job.done.set()
+                self._queue.task_done()
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.result_ttl_s
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "max_queued": self._queue.maxsize,
+            "pending": len(self._pending),
+            "jobs": len(self._jobs),
+            "deduplicated": self.deduplicated,
+            "rejected": self.rejected,
+        }
+
+
+def submit_job(request: Request, kind: str, payload: BaseModel) -> Job:
+    try:
+        return request.app.state.jobs.submit(kind, payload)
+    except QueueFull as e:
+        raise HTTPException(
+            status_code=429, detail=str(e), headers={"Retry-After": str(JOB_RETRY_AFTER_S)}
+        )
+
+
+async def run_job(request: Request, response: Response, kind: str, payload: BaseModel) -> BaseModel:
+    """Caminho síncrono: entra na fila e espera o resultado."""
+    job = await request.app.state.jobs.wait(submit_job(request, kind, payload), JOB_SYNC_TIMEOUT_S)
+    if not job.done.is_set():
+        # o job continua rodando; o cliente pode buscar o resultado em /jobs/{id}
+        raise HTTPException(status_code=504, detail=f"Job {job.id} ainda não terminou; consulte /jobs/{job.id}")
+    response.headers["Server-Timing"] = server_timing(job.timings)
+    if job.status == "error":
+        raise HTTPException(status_code=500, detail=job.error)
+    return job.result
+
+
 # ---------- ENDPOINTS ----------
 @app.get("/")
 def root():
     return {"status": "API de odds online 🚀"}
 
 
+@app.get("/health")
+async def health(request: Request):
+    # mesmo esquema do /metrics: estado lido no event loop, só o /proc vai para thread
+    table = await asyncio.to_thread(read_process_table)
+    return {
+        "status": "ok",
+        "pool": request.app.state.pool.stats(table),
+        "cache": request.app.state.cache.stats(),
+        "live": request.app.state.live.stats(),
+        "jobs": request.app.state.jobs.stats(),
+    }
+
+
 @app.post("/odds", response_model=OddsResponse)
-def odds(payload: OddsRequest):
+async def odds(payload: OddsRequest, request: Request, response: Response):
+    return await run_job(request, response, "odds", payload)
+
+
+@app.post("/odds/batch", response_model=BatchOddsResponse)
+async def odds_batch(payload: BatchOddsRequest, request: Request, response: Response):
+    return await run_job(request, response, "batch", payload)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    # roda no event loop, junto de quem grava as métricas; só a leitura do /proc vai para thread
+    state = request.app.state
+    cache = state.cache.stats()
+    jobs = state.jobs.stats()
+    rss = await asyncio.to_thread(browser_rss_mb)
+    return METRICS.render(
+        gauges={
+            "odds_browser_rss_bytes": ("RSS dos processos do browser", rss * 1024 * 1024 if rss is not None else None),
+            "odds_cache_entries": ("Entradas no cache de odds", cache["entries"]),
+            "odds_jobs_queued": ("Jobs esperando na fila", jobs["queued"]),
+        },
+        totals={
+            "odds_cache_hits_total": ("Acertos do cache", cache["hits"]),
+            "odds_cache_misses_total": ("Faltas do cache", cache["misses"]),
+            "odds_jobs_rejected_total": ("Jobs recusados com 429", jobs["rejected"]),
+        },
+    )
+
+
+@app.post("/jobs/odds", response_model=JobOut, status_code=202)
+async def create_odds_job(payload: OddsRequest, request: Request):
+    return submit_job(request, "odds", payload).out()
+
+
+@app.post("/jobs/odds/batch", response_model=JobOut, status_code=202)
+async def create_batch_job(payload: BatchOddsRequest, request: Request):
+    return submit_job(request, "batch", payload).out()
+
+
+@app.get("/jobs/{job_id}", response_model=JobOut)
+async def get_job(job_id: str, request: Request, wait: float = 0):
+    """Consulta um job; com ?wait=N segura a resposta até N segundos esperando terminar."""
+    jobs: JobQueue = request.app.state.jobs
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    if wait > 0 and not job.done.is_set():
+        await jobs.wait(job, min(wait, JOB_MAX_WAIT_S))
+    return job.out()
+
+
+@app.get("/odds/stream")
+async def odds_stream(site: str, url: HttpUrl, market: str, request: Request):
+    """
+    Server-Sent Events com as odds de um site/mercado ao vivo.
+    Envia o estado atual ao conectar e depois só quando over/under mudam.
+    Se a página cair (ou o browser dela for reciclado), envia "end" e o cliente reconecta.
+    """
+    if site not in SITE_SELECTORS:
+        raise HTTPException(status_code=404, detail=f"Site desconhecido: {site}")
+    hub: LiveHub = request.app.state.live
     try:
-        return run_playwright(payload)
+        watcher, queue = await hub.subscribe(site, str(url), market)
+    except (PoolExhausted, LiveLimitReached) as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=LIVE_HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                if item is None:
+                    yield "event: end\ndata: {}\n\n"
+                    break
+                yield f"event: odds\ndata: {json.dumps(item)}\n\n"
+        finally:
+            await hub.unsubscribe(watcher, market, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
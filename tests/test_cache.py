@@ -0,0 +1,129 @@
+import asyncio
+from typing import Any, Dict, List
+
+from main import OddsCache
+
+KEY = ("kto", "https://kto.example/jogo", "9.5")
+
+
+def result(over: float, ok: bool = True, source: str = "text") -> Dict[str, Any]:
+    return {"ok": ok, "url": KEY[1], "over": over, "under": 1.9, "err": "", "source": source}
+
+
+class Fetcher:
+    """fetch_many falso: conta as chamadas e devolve `values` em ordem."""
+
+    def __init__(self, *values: Dict[str, Any], delay_s: float = 0.0):
+        self.values = list(values)
+        self.delay_s = delay_s
+        self.calls: List[List[tuple]] = []
+
+    async def __call__(self, keys):
+        self.calls.append(list(keys))
+        await asyncio.sleep(self.delay_s)
+        value = self.values.pop(0)
+        return {key: value for key in keys}
+
+
+def test_concurrent_requests_share_one_fetch():
+    async def run():
+        cache = OddsCache(max_entries=10)
+        fetch = Fetcher(result(1.8), delay_s=0.01)
+        first, second = await asyncio.gather(
+            cache.get_or_fetch_many([KEY], 5, fetch),
+            cache.get_or_fetch_many([KEY], 5, fetch),
+        )
+        return cache, fetch, first[KEY], second[KEY]
+
+    cache, fetch, first, second = asyncio.run(run())
+    assert len(fetch.calls) == 1
+    assert (first["cache"], second["cache"]) == ("miss", "coalesced")
+    assert first["over"] == second["over"] == 1.8
+    assert cache.stats()["coalesced"] == 1
+
+
+def test_hit_within_ttl():
+    async def run():
+        cache = OddsCache(max_entries=10)
+        fetch = Fetcher(result(1.8))
+        await cache.get_or_fetch_many([KEY], 5, fetch)
+        return fetch, (await cache.get_or_fetch_many([KEY], 5, fetch))[KEY]
+
+    fetch, second = asyncio.run(run())
+    assert len(fetch.calls) == 1
+    assert second["cache"] == "hit"
+
+
+def test_failed_and_selector_results_are_not_cached():
+    async def run():
+        cache = OddsCache(max_entries=10)
+        fetch = Fetcher(result(None, ok=False), result(1.6, source="selector"), result(1.8))
+        statuses = []
+        for _ in range(3):
+            statuses.append((await cache.get_or_fetch_many([KEY], 5, fetch))[KEY]["cache"])
+        return cache, fetch, statuses
+
+    cache, fetch, statuses = asyncio.run(run())
+    assert statuses == ["miss", "miss", "miss"]
+    assert len(fetch.calls) == 3
+    assert cache.stats()["entries"] == 1
+
+
+def test_stale_entry_is_served_while_it_refreshes():
+    async def run():
+        cache = OddsCache(max_entries=10, stale_while_revalidate=True, stale_max_s=30)
+        fetch = Fetcher(result(1.8), result(2.0))
+        await cache.get_or_fetch_many([KEY], 5, fetch)
+        cache._entries[KEY].stored_at -= 10  # venceu há 5s, ainda dentro do stale_max_s
+        stale = (await cache.get_or_fetch_many([KEY], 5, fetch))[KEY]
+        await asyncio.gather(*cache._inflight.values())
+        fresh = (await cache.get_or_fetch_many([KEY], 5, fetch))[KEY]
+        return fetch, stale, fresh
+
+    fetch, stale, fresh = asyncio.run(run())
+    assert (stale["cache"], stale["over"]) == ("stale", 1.8)
+    assert (fresh["cache"], fresh["over"]) == ("hit", 2.0)
+    assert len(fetch.calls) == 2
+
+
+def test_expired_beyond_stale_window_is_a_miss():
+    async def run():
+        cache = OddsCache(max_entries=10, stale_while_revalidate=True, stale_max_s=1)
+        fetch = Fetcher(result(1.8), result(2.0))
+        await cache.get_or_fetch_many([KEY], 5, fetch)
+        cache._entries[KEY].stored_at -= 10
+        return (await cache.get_or_fetch_many([KEY], 5, fetch))[KEY]
+
+    second = asyncio.run(run())
+    assert (second["cache"], second["over"]) == ("miss", 2.0)
+
+
+def test_lru_evicts_least_recently_used():
+    keys = [("kto", f"https://kto.example/{i}", "9.5") for i in range(3)]
+
+    async def run():
+        cache = OddsCache(max_entries=2)
+        fetch = Fetcher(*(result(1.8) for _ in range(4)))
+        await cache.get_or_fetch_many([keys[0]], 5, fetch)
+        await cache.get_or_fetch_many([keys[1]], 5, fetch)
+        await cache.get_or_fetch_many([keys[0]], 5, fetch)  # 0 vira o mais recente
+        await cache.get_or_fetch_many([keys[2]], 5, fetch)  # expulsa o 1
+        return cache
+
+    cache = asyncio.run(run())
+    assert list(cache._entries) == [keys[0], keys[2]]
+
+
+def test_many_keys_fetch_only_the_missing_ones_in_one_call():
+    other = KEY[:2] + ("10.5",)
+
+    async def run():
+        cache = OddsCache(max_entries=10)
+        fetch = Fetcher(result(1.8), result(2.2))
+        await cache.get_or_fetch_many([KEY], 5, fetch)
+        found = await cache.get_or_fetch_many([KEY, other], 5, fetch)
+        return fetch, found
+
+    fetch, found = asyncio.run(run())
+    assert fetch.calls == [[KEY], [other]]
+    assert (found[KEY]["cache"], found[other]["cache"]) == ("hit", "miss")
@@ -0,0 +1,68 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from main import JOB_RETRY_AFTER_S, JobQueue, OddsRequest, QueueFull, submit_job
+
+
+def payload(market: str = "9.5") -> OddsRequest:
+    return OddsRequest(
+        market=market,
+        betano={"url": "https://betano.example/jogo"},
+        bet365={"url": "https://bet365.example/jogo"},
+        kto={"url": "https://kto.example/jogo"},
+    )
+
+
+async def fake_fetch(site, url, markets):
+    await asyncio.sleep(0)
+    return {m: {"ok": True, "url": url, "over": 1.8, "under": 1.9, "err": "", "source": "text"} for m in markets}
+
+
+def test_identical_pending_jobs_are_deduplicated():
+    async def run():
+        jobs = JobQueue(fake_fetch, max_queued=5)
+        return jobs, jobs.submit("odds", payload()), jobs.submit("odds", payload())
+
+    jobs, first, second = asyncio.run(run())
+    assert first is second
+    assert jobs.stats()["deduplicated"] == 1
+
+
+def test_full_queue_rejects_with_429_and_retry_after():
+    async def run():
+        jobs = JobQueue(fake_fetch, max_queued=1)
+        jobs.submit("odds", payload("9.5"))
+        with pytest.raises(QueueFull):
+            jobs.submit("odds", payload("10.5"))
+        request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(jobs=jobs)))
+        with pytest.raises(HTTPException) as exc:
+            submit_job(request, "odds", payload("11.5"))
+        return jobs, exc.value
+
+    jobs, exc = asyncio.run(run())
+    assert exc.status_code == 429
+    assert exc.headers == {"Retry-After": str(JOB_RETRY_AFTER_S)}
+    assert jobs.stats()["rejected"] == 2
+
+
+def test_worker_runs_job_and_frees_the_key():
+    async def run():
+        jobs = JobQueue(fake_fetch, workers=1, max_queued=1)
+        jobs.start()
+        try:
+            job = jobs.submit("odds", payload())
+            await jobs.wait(job, 1)
+            again = jobs.submit("odds", payload())
+            await jobs.wait(again, 1)
+        finally:
+            await jobs.close()
+        return job, again
+
+    job, again = asyncio.run(run())
+    assert job.status == "done"
+    assert job.result.kto.over == 1.8
+    assert "queue" in job.timings and "total" in job.timings
+    assert again is not job
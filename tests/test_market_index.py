@@ -0,0 +1,34 @@
+from main import build_market_index, market_odds
+
+
+def test_index_keeps_first_odd_after_each_label():
+    index = build_market_index("<div>Mais de 9,5</div><b>1,85</b> <div>Menos de 9.5</div><b>1.95</b>")
+    assert index == {("mais de", "9.5"): 1.85, ("menos de", "9.5"): 1.95}
+
+
+def test_odd_does_not_cross_the_next_label():
+    index = build_market_index("Over 9.5 Under 9.5 <span>1.80</span>")
+    assert index == {("under", "9.5"): 1.80}
+
+
+def test_suspended_line_has_no_odd():
+    index = build_market_index("Over 9.5 - Over 10.5 2.10 Under 10.5 1.70")
+    assert ("over", "9.5") not in index
+    assert index[("over", "10.5")] == 2.10
+
+
+def test_first_occurrence_of_a_line_wins():
+    index = build_market_index("Over 9.5 1.85 Under 9.5 1.95 ... Over 9.5 3.00")
+    assert index[("over", "9.5")] == 1.85
+
+
+def test_market_odds_reads_each_line_from_the_index():
+    index = build_market_index("Mais de 8.5 1.60 Menos de 8.5 2.22 Over 9.5 1.87 Under 9.5 1.93")
+    assert market_odds(index, "8,5") == (1.60, 2.22)
+    assert market_odds(index, " 9.5") == (1.87, 1.93)
+
+
+def test_selectors_only_fill_a_page_without_market_text():
+    index = build_market_index("Mais de 8.5 1.60 Menos de 8.5 2.22")
+    assert market_odds(index, "12.5", 1.60, 1.60) == (None, None)
+    assert market_odds({}, "12.5", 1.60, 2.22) == (1.60, 2.22)
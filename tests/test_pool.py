@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from main import BrowserPool, PoolExhausted, PooledBrowser
+
+
+class FakeContext:
+    async def close(self):
+        pass
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **kwargs):
+        return FakeContext()
+
+    async def close(self):
+        self.connected = False
+
+
+class FakeChromium:
+    def __init__(self):
+        self.launched = 0
+
+    async def launch(self, **kwargs):
+        self.launched += 1
+        return FakeBrowser()
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.chromium = FakeChromium()
+
+    async def stop(self):
+        pass
+
+
+async def make_pool(**kwargs) -> BrowserPool:
+    """BrowserPool com browsers falsos (mesmo caminho do start(), sem Playwright)."""
+    kwargs.setdefault("max_rss_mb", 0)
+    pool = BrowserPool(**kwargs)
+    pool._pw = FakePlaywright()
+    for i in range(pool.size):
+        slot = PooledBrowser(i)
+        await pool._launch(slot)
+        pool._slots.append(slot)
+        for _ in range(pool.contexts_per_browser):
+            pool._idle.put_nowait(slot)
+    return pool
+
+
+async def settle():
+    # deixa a reciclagem em segundo plano terminar
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_browser_recycles_after_max_uses():
+    async def run():
+        pool = await make_pool(size=1, contexts_per_browser=2, max_uses=3)
+        first = pool._slots[0].browser
+        for _ in range(3):
+            async with pool.context():
+                pass
+        await settle()
+        second = pool._slots[0].browser
+        await pool.close()
+        return pool, first, second
+
+    pool, first, second = asyncio.run(run())
+    assert pool.recycled == 1
+    assert second is not first
+    assert not first.connected
+    assert pool._slots[0].uses == 0
+
+
+def test_draining_browser_waits_for_open_contexts():
+    async def run():
+        pool = await make_pool(size=1, contexts_per_browser=3, max_uses=2)
+        async with pool.context():
+            async with pool.context():
+                pass
+            await settle()
+            recycled_while_open = pool.recycled
+        await settle()
+        await pool.close()
+        return recycled_while_open, pool.recycled
+
+    recycled_while_open, recycled = asyncio.run(run())
+    assert recycled_while_open == 0
+    assert recycled == 1
+
+
+def test_live_context_does_not_block_recycling():
+    async def run():
+        pool = await make_pool(size=1, contexts_per_browser=4, max_uses=3, acquire_timeout_s=0.5)
+        async with pool.context(live=True):
+            for _ in range(6):
+                async with pool.context():
+                    pass
+                await settle()
+        await pool.close()
+        return pool.recycled
+
+    assert asyncio.run(run()) >= 1
+
+
+def test_disconnected_browser_is_relaunched():
+    async def run():
+        pool = await make_pool(size=1, contexts_per_browser=1, max_uses=0)
+        chromium = pool._pw.chromium
+        pool._slots[0].browser.connected = False
+        async with pool.context():
+            connected = pool._slots[0].browser.is_connected()
+        await pool.close()
+        return pool, chromium, connected
+
+    pool, chromium, connected = asyncio.run(run())
+    assert connected
+    assert pool.recycled == 1
+    assert chromium.launched == 2
+
+
+def test_acquire_times_out_when_every_slot_is_busy():
+    async def run():
+        pool = await make_pool(size=1, contexts_per_browser=1, max_uses=0, acquire_timeout_s=0.05)
+        try:
+            async with pool.context():
+                with pytest.raises(PoolExhausted):
+                    async with pool.context():
+                        pass
+        finally:
+            await pool.close()
+
+    asyncio.run(run())